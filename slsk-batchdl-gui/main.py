@@ -1,41 +1,221 @@
 import asyncio
+import heapq
 import subprocess
-import tempfile
+import sys
 import json
 import os
 import re
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from difflib import SequenceMatcher
+from typing import Optional, List, Dict, Any, AsyncIterator, Union, Tuple
 
 import httpx
 from fastapi import FastAPI, File, Form, UploadFile, Request
 from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from rapidfuzz import fuzz
+from rapidfuzz import process as fuzz_process
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# orjson is considerably faster for the many small frames we emit; fall back to
+# the standard library if it isn't installed. Both dump to bytes.
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    json_loads = json.loads
+
+# Shared HTTP client so metadata lookups reuse pooled keep-alive connections.
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared HTTP client, creating it if it isn't open (e.g. the app runs without its lifespan)."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(timeout=5.0, limits=httpx.Limits(max_keepalive_connections=32))
+    return http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client = get_http_client()
+    try:
+        yield
+    finally:
+        await client.aclose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
+# Absolute path to the sldl executable, assumed to be in the same directory.
+SLDL_PATH = str((BASE_DIR / "sldl").resolve())
+
+# sldl settings from the environment. These don't change while the app runs.
+SLSK_PATH = os.getenv("SLSK_PATH", "/downloads")
+SLSK_USER = os.getenv("SLSK_USER")
+SLSK_PASS = os.getenv("SLSK_PASS")
+
+# Options added to every download command, built once at startup.
+DOWNLOAD_ARGS = ["--path", SLSK_PATH]
+if SLSK_USER:
+    DOWNLOAD_ARGS.extend(["--user", SLSK_USER])
+if SLSK_PASS:
+    DOWNLOAD_ARGS.extend(["--pass", SLSK_PASS])
+# Default to preferring FLAC
+DOWNLOAD_ARGS.extend(["--pref-format", "flac"])
+# Disable progress bars and interactive features in Docker
+DOWNLOAD_ARGS.append("--no-progress")
+
+# How many bytes to pull from the sldl pipes per read.
+STREAM_CHUNK_SIZE = 65536
+
+# How many bytes of an uploaded file to copy to disk at a time.
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Buffer size for sldl's output, both in the StreamReader and (on Linux) the pipe
+# itself, so bursts of output don't keep pausing the pipe.
+PIPE_BUFFER_SIZE = 1 << 20
+# fcntl.F_SETPIPE_SZ is only exposed from Python 3.10 on.
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031) if fcntl else None
+
+# Keep proxies (e.g. nginx) and caches from buffering the event streams.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+    "Connection": "keep-alive",
+}
+
+# Pre-encoded pieces of the event stream. Events are yielded as bytes so they
+# don't need encoding again before being sent.
+SSE_DATA = b"data: "
+SSE_END = b"\n\n"
+SSE_DONE = b"event: done\ndata: {}\n\n"
+SSE_CRASH = b"event: crash\ndata: "
+
+# Output lines containing any of these phrases are shown in red.
+_ERR_RE = re.compile(rb'no results|not found|failed|no suitable file', re.IGNORECASE)
+
+async def iter_line_batches(stream: asyncio.StreamReader) -> AsyncIterator[List[bytes]]:
+    """
+    Reads a subprocess stream in large chunks and yields the complete lines
+    (newlines included) contained in each chunk as one batch.
+    A trailing line without a newline is yielded on its own once the stream ends.
+    """
+    pending = bytearray()
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        end = pending.rfind(b"\n") + 1
+        if not end:
+            continue
+        lines = bytes(pending[:end]).splitlines(keepends=True)
+        del pending[:end]
+        yield lines
+
+    if pending:
+        yield [bytes(pending)]
+
+# Pre-encoded JSON for the start of an output message, so only the text needs escaping.
+_MESSAGE_PREFIXES = {
+    'default': b'{"color":"default","text":',
+    'red': b'{"color":"red","text":',
+}
+
+def encode_messages(lines: List[bytes], color: str) -> bytes:
+    """
+    Encodes output lines as a JSON array of {text, color} messages.
+    Lines matching an error keyword are colored red, all others get the given color.
+    """
+    red = _MESSAGE_PREFIXES['red']
+    prefix = _MESSAGE_PREFIXES[color]
+    return b"[" + b",".join(
+        (red if _ERR_RE.search(line) else prefix) + json_dumps(line.decode('utf-8', 'replace')) + b"}"
+        for line in lines
+    ) + b"]"
+
+def enlarge_pipes(process: asyncio.subprocess.Process) -> None:
+    """Raises the kernel buffer size of the process's stdout and stderr pipes on Linux."""
+    if F_SETPIPE_SZ is None or not sys.platform.startswith("linux"):
+        return
+    for fd in (1, 2):
+        transport = process._transport.get_pipe_transport(fd)
+        pipe = transport.get_extra_info("pipe") if transport else None
+        # The pipe is already closed if sldl exited straight away.
+        if pipe is None or pipe.closed:
+            continue
+        try:
+            fcntl.fcntl(pipe.fileno(), F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+        except OSError as e:
+            print(f"DEBUG: Could not resize pipe: {e}")
+
+async def read_output(stream: asyncio.StreamReader, queue: asyncio.Queue, color: str) -> None:
+    """
+    Reads sldl output in chunks and puts the lines of each chunk on the queue as
+    one encoded batch of messages, followed by None once the stream ends.
+    """
+    try:
+        async for lines in iter_line_batches(stream):
+            await queue.put(encode_messages(lines, color))
+    except Exception as e:
+        print(f"DEBUG: Output read error: {e}")
+    # Not reached when cancelled, as nobody is reading the queue anymore then.
+    await queue.put(None)
+
+async def stop_on_disconnect(request: Request, process: asyncio.subprocess.Process) -> None:
+    """Terminates the process once the client that requested it has disconnected."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(1)
+    if process.returncode is None:
+        print("DEBUG: Client disconnected, terminating sldl")
+        process.terminate()
+
+# Junk stripped from album folder names, in two passes:
+# 1. Leading years: (2001), [2001], 2001 -
+#    and formats: [FLAC], (FLAC), [MP3], [320]
+_ALBUM_YEAR_FORMAT_RE = re.compile(
+    r'^[\(\[]?\d{4}[\)\]]?\s*-?\s*'
+    r'|[\(\[]?(?:FLAC|MP3|320|V0|AAC)[\)\]]?',
+    re.IGNORECASE
+)
+# 2. Other common tags: [CD], (Web), {Vinyl}
+#    This runs afterwards so tags nested in them, e.g. (Deluxe [FLAC] Edition), are already gone.
+_ALBUM_TAG_RE = re.compile(r'[\(\[\{].*?[\)\]\}]')
+
+# Artist folder names that are really just share roots.
+GENERIC_FOLDERS = frozenset({'music', 'mp3', 'flac', 'uploads', 'soulseek', 'downloads', 'complete'})
+
 async def fetch_itunes_album(artist: str, album: str) -> Optional[str]:
     """Search iTunes for Album Art"""
     try:
         query = f"{artist} {album}"
         url = "https://itunes.apple.com/search"
         params = {"term": query, "media": "music", "entity": "album", "limit": 1}
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, params=params, timeout=5.0)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data["resultCount"] > 0:
-                    # Get 100x100 and try to upscale effectively by hack?
-                    # iTunes provides 100x100, but we can change the URL to 600x600
-                    art = data["results"][0].get("artworkUrl100")
-                    if art:
-                        return art.replace("100x100bb", "600x600bb")
+        resp = await get_http_client().get(url, params=params)
+        if resp.status_code == 200:
+            data = resp.json()
+            if data["resultCount"] > 0:
+                # Get 100x100 and try to upscale effectively by hack?
+                # iTunes provides 100x100, but we can change the URL to 600x600
+                art = data["results"][0].get("artworkUrl100")
+                if art:
+                    return art.replace("100x100bb", "600x600bb")
     except Exception as e:
         print(f"DEBUG: iTunes fetch error: {e}")
     return None
@@ -45,23 +225,51 @@ async def fetch_deezer_artist(artist: str) -> Optional[str]:
     try:
         url = "https://api.deezer.com/search/artist"
         params = {"q": artist, "limit": 1}
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, params=params, timeout=5.0)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("data"):
-                    return data["data"][0].get("picture_xl") # High res artist image
+        resp = await get_http_client().get(url, params=params)
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("data"):
+                return data["data"][0].get("picture_xl") # High res artist image
     except Exception as e:
         print(f"DEBUG: Deezer fetch error: {e}")
     return None
 
+# Cover art lookups, keyed by normalized (artist, album): (expiry time, art url).
+# Kept in LRU order and bounded to METADATA_CACHE_SIZE entries.
+METADATA_CACHE_SIZE = 1024
+METADATA_CACHE_TTL = 24 * 60 * 60
+# A miss may just be a network hiccup, so don't remember it for as long.
+METADATA_MISS_TTL = 10 * 60
+_META_CACHE: "OrderedDict[Tuple[str, str], Tuple[float, Optional[str]]]" = OrderedDict()
+
 async def fetch_metadata(artist: str, album: str) -> Optional[str]:
     """
     Fetches album art URL from iTunes, falling back to Deezer Artist image.
+    Results are cached per artist/album.
     """
     if not artist:
         return None
 
+    key = (artist.lower().strip(), album.lower().strip())
+    cached = _META_CACHE.get(key)
+    if cached and cached[0] > time.monotonic():
+        _META_CACHE.move_to_end(key)
+        return cached[1]
+
+    art = await fetch_metadata_uncached(artist, album)
+
+    ttl = METADATA_CACHE_TTL if art else METADATA_MISS_TTL
+    _META_CACHE[key] = (time.monotonic() + ttl, art)
+    _META_CACHE.move_to_end(key)
+    if len(_META_CACHE) > METADATA_CACHE_SIZE:
+        _META_CACHE.popitem(last=False)
+
+    return art
+
+async def fetch_metadata_uncached(artist: str, album: str) -> Optional[str]:
+    """
+    Looks up album art from iTunes, falling back to Deezer Artist image.
+    """
     # 1. Try iTunes Album Art
     if album and album != "Unknown":
         art = await fetch_itunes_album(artist, album)
@@ -73,15 +281,13 @@ async def fetch_metadata(artist: str, album: str) -> Optional[str]:
 
     return None
 
-def parse_slsk_json(json_output: str) -> List[Dict[str, Any]]:
+def collect_slsk_json(json_output: Union[str, bytes], candidates: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
     """
-    Parses slsk-batchdl JSON output and extracts potential albums.
-    Returns a list of dictionaries with artist, album, and sample filename.
+    Parses a single slsk-batchdl JSON document and adds the potential albums
+    it contains to candidates, merging files of albums that are already there.
     """
-    candidates = {}
-
     try:
-        results = json.loads(json_output)
+        results = json_loads(json_output)
         if not isinstance(results, list):
             results = [results]
 
@@ -94,7 +300,8 @@ def parse_slsk_json(json_output: str) -> List[Dict[str, Any]]:
 
             # Normalize path separators
             filename = filename.replace("\\", "/")
-            parts = filename.split("/")
+            # Only the last three components (artist/album/track) are needed
+            parts = filename.rsplit("/", 3)
 
             artist = "Unknown"
             album = "Unknown"
@@ -109,8 +316,7 @@ def parse_slsk_json(json_output: str) -> List[Dict[str, Any]]:
 
                 # Heuristic: If artist folder is generic, try parsing album folder
                 # e.g. /Music/Artist - Album/Track.mp3
-                generic_folders = ['music', 'mp3', 'flac', 'uploads', 'soulseek', 'downloads', 'complete']
-                if raw_artist.lower() in generic_folders and " - " in raw_album:
+                if raw_artist.lower() in GENERIC_FOLDERS and " - " in raw_album:
                      split_album = raw_album.split(" - ", 1)
                      artist = split_album[0]
                      album = split_album[1]
@@ -130,26 +336,19 @@ def parse_slsk_json(json_output: str) -> List[Dict[str, Any]]:
                      continue
 
             # CLEANUP LOGIC
-            # Remove common junk from Album name to improve MB search
-
-            # 1. Remove years: (2001), [2001], 2001 -
-            album = re.sub(r'^[\(\[]?\d{4}[\)\]]?\s*[-]?\s*', '', album)
+            # Remove years, formats and other tags from Album name to improve MB search
+            album = _ALBUM_TAG_RE.sub('', _ALBUM_YEAR_FORMAT_RE.sub('', album))
 
-            # 2. Remove formats: [FLAC], (FLAC), [MP3], [320]
-            album = re.sub(r'[\(\[]?(?:FLAC|MP3|320|V0|AAC)[\)\]]?', '', album, flags=re.IGNORECASE)
-
-            # 3. Remove other common tags: [CD], (Web), {Vinyl}
-            album = re.sub(r'[\(\[\{].*?[\)\]\}]', '', album)
-
-            # 4. Clean whitespace
+            # Clean whitespace
             artist = artist.strip()
             album = album.strip()
 
             if not artist or not album or artist == "Unknown":
                 continue
 
-            key = f"{artist}|{album}"
-            if key not in candidates:
+            key = (artist, album)
+            entry = candidates.get(key)
+            if entry is None:
                 candidates[key] = {
                     "artist": artist,
                     "album": album,
@@ -157,16 +356,44 @@ def parse_slsk_json(json_output: str) -> List[Dict[str, Any]]:
                     "sample_file": filename
                 }
             else:
-                candidates[key]["files"] += 1
-
-        return list(candidates.values())
+                entry["files"] += 1
 
     except json.JSONDecodeError:
         print("DEBUG: Failed to decode JSON from sldl")
-        return []
     except Exception as e:
         print(f"DEBUG: Parsing error: {e}")
-        return []
+
+
+def collect_slsk_lines(lines: List[Union[str, bytes]], candidates: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+    """
+    Adds the potential albums from lines of sldl output to candidates.
+    sldl prints one JSON document per searched track, each on its own line.
+    """
+    for line in lines:
+        if line.strip():
+            collect_slsk_json(line, candidates)
+
+
+def score_candidates(query: str, candidates: List[Dict[str, Any]]) -> None:
+    """
+    Scores each candidate by its similarity to the search query and stores it under "score".
+    We want to prioritize results that match the user's intent, not just those with most files.
+    """
+    query = query.lower()
+    # Construct a target string to compare against (e.g. "daft punk discovery")
+    choices = [f"{res['artist']} {res['album']}".lower() for res in candidates]
+
+    # Fuzzy match ratio of the words, computed for all candidates in one call
+    matches = fuzz_process.extract(query, choices, scorer=fuzz.token_set_ratio, processor=None, limit=None)
+    for candidate_str, score, index in matches:
+        score /= 100.0
+
+        # Boost score if exact words are present (simple containment)
+        # This helps if input is "Discovery" and candidate is "Daft Punk Discovery" -> ratio might be lowish but it's a substring
+        if query in candidate_str:
+            score += 0.2
+
+        candidates[index]["score"] = score
 
 
 def build_command(
@@ -182,9 +409,7 @@ def build_command(
     use_database: bool = False,
 ) -> List[str]:
     """Builds the slsk-batchdl command list from the given options."""
-    # Construct the absolute path to the executable, assuming it's in the same directory.
-    executable_path = BASE_DIR / "sldl"
-    command = [str(executable_path)]
+    command = [SLDL_PATH]
 
     # Determine the primary input for the command based on a clear precedence:
     # 1. Spotify URL (highest priority)
@@ -197,23 +422,8 @@ def build_command(
     elif input_text:
         command.append(input_text)
 
-    # Add optional arguments to the command if they have been provided.
-    path = os.getenv("SLSK_PATH", "/downloads")
-    command.extend(["--path", path])
-
-    user = os.getenv("SLSK_USER")
-    if user:
-        command.extend(["--user", user])
-
-    password = os.getenv("SLSK_PASS")
-    if password:
-        command.extend(["--pass", password])
-
-    # Default to preferring FLAC
-    command.extend(["--pref-format", "flac"])
-
-    # Disable progress bars and interactive features in Docker
-    command.append("--no-progress")
+    # Add the download location, credentials and default options.
+    command.extend(DOWNLOAD_ARGS)
 
     # Add boolean flags, which are only present if their value is True.
     if desperate:
@@ -238,6 +448,13 @@ def build_command(
     return command
 
 
+def copy_upload(upload: UploadFile, save_path: Path) -> None:
+    """Writes an uploaded file to save_path one chunk at a time."""
+    upload.file.seek(0)
+    with open(save_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer, UPLOAD_CHUNK_SIZE)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -258,13 +475,12 @@ async def search_command(
     # We use minimal flags just to find files.
     # --print json-all is the key.
 
-    executable_path = BASE_DIR / "sldl"
     command = [
-        str(executable_path),
+        SLDL_PATH,
         input_text,
         "--print", "json-all",
-        "--user", os.getenv("SLSK_USER", ""),
-        "--pass", os.getenv("SLSK_PASS", ""),
+        "--user", SLSK_USER or "",
+        "--pass", SLSK_PASS or "",
         "--fast-search", # Speed up things for visual search
         "--search-timeout", "30000", # 30s timeout to prevent SIGABRT/timeout
         "--no-progress" # Disable progress bars to avoid Console.KeyAvailable issues in Docker
@@ -278,10 +494,21 @@ async def search_command(
             stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            cwd=BASE_DIR
+            cwd=BASE_DIR,
+            limit=PIPE_BUFFER_SIZE
         )
-
-        stdout, stderr = await process.communicate()
+        enlarge_pipes(process)
+
+        # sldl prints one JSON document per searched track, so parse each line as it
+        # arrives instead of buffering the whole output until the process exits.
+        # stderr is drained alongside so a full pipe can't stall sldl.
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        candidates = {}
+        async for lines in iter_line_batches(process.stdout):
+            # Parsing large results is CPU heavy, so keep it off the event loop
+            await asyncio.to_thread(collect_slsk_lines, lines, candidates)
+        stderr = await stderr_task
+        await process.wait()
 
         if process.returncode != 0:
             stderr_text = stderr.decode()
@@ -293,47 +520,29 @@ async def search_command(
                 "returncode": process.returncode
             }, status_code=500)
 
-        output = stdout.decode('utf-8')
-
-        # Parse output
-        parsed_results = parse_slsk_json(output)
+        parsed_results = list(candidates.values())
 
         # Smart Sorting (Replicating Soularr-like logic)
-        # Calculate similarity between input query and "Artist Album"
-        # We want to prioritize results that match the user's intent, not just those with most files.
-        for res in parsed_results:
-            # Construct a target string to compare against (e.g. "Daft Punk Discovery")
-            candidate_str = f"{res['artist']} {res['album']}"
-
-            # Simple fuzzy match ratio
-            # You could weight this: check if words in input appear in candidate
-            score = SequenceMatcher(None, input_text.lower(), candidate_str.lower()).ratio()
-
-            # Boost score if exact words are present (simple containment)
-            # This helps if input is "Discovery" and candidate is "Daft Punk Discovery" -> ratio might be lowish but it's a substring
-            if input_text.lower() in candidate_str.lower():
-                score += 0.2
-
-            res["score"] = score
-
-        # Sort by Score (Desc), then by File Count (Desc)
-        parsed_results.sort(key=lambda x: (x["score"], x["files"]), reverse=True)
+        await asyncio.to_thread(score_candidates, input_text, parsed_results)
 
+        # Keep the best results by Score (Desc), then by File Count (Desc)
         # Limit results (fetch metadata only for the best)
-        top_results = parsed_results[:10]
-
-        # Fetch metadata for top results
-        final_results = []
-        for res in top_results:
-             # Skip very low relevance results? Soularr uses 0.8
-             # But our input might be partial. Let's not be too strict, just sort.
-
-            art_url = await fetch_metadata(res["artist"], res["album"])
+        top_results = heapq.nlargest(10, parsed_results, key=lambda x: (x["score"], x["files"]))
+
+        # Fetch metadata for all top results concurrently
+        # Skip very low relevance results? Soularr uses 0.8
+        # But our input might be partial. Let's not be too strict, just sort.
+        arts = await asyncio.gather(
+            *(fetch_metadata(res["artist"], res["album"]) for res in top_results),
+            return_exceptions=True
+        )
+        for res, art_url in zip(top_results, arts):
+            if isinstance(art_url, BaseException):
+                art_url = None
             # Use a reliable external placeholder service
             res["art_url"] = art_url or "https://placehold.co/200x200?text=No+Art"
-            final_results.append(res)
 
-        return JSONResponse({"results": final_results})
+        return JSONResponse({"results": top_results})
 
     except Exception as e:
         print(f"DEBUG: Search exception: {e}")
@@ -358,18 +567,17 @@ async def run_command(
     print(f"DEBUG: Received request with input_text='{input_text}', spotify_url='{spotify_playlist_url}', file='{input_file.filename if input_file else None}'")
 
     if not any([input_text, (input_file and input_file.filename), spotify_playlist_url]):
-        async def stream_error():
-             yield "data: " + json.dumps({'text': 'Error: No input provided. Please enter search terms, a URL, or upload a file.\n', 'color': 'red'}) + "\n\n"
-             yield "data: " + json.dumps({'event': 'DONE'}) + "\n\n"
-        return StreamingResponse(stream_error(), media_type="text/event-stream")
+        async def stream_error() -> AsyncIterator[bytes]:
+             yield SSE_DATA + json_dumps({'text': 'Error: No input provided. Please enter search terms, a URL, or upload a file.\n', 'color': 'red'}) + SSE_END
+             yield SSE_DONE
+        return StreamingResponse(stream_error(), media_type="text/event-stream", headers=SSE_HEADERS)
 
     input_file_path = None
     # If a CSV file is uploaded, save it to the project's root directory.
     if input_file and input_file.filename:
         save_path = BASE_DIR / input_file.filename
-        with open(save_path, "wb") as buffer:
-            content = await input_file.read()
-            buffer.write(content)
+        # Copy in fixed-size chunks off the event loop so large uploads aren't held in memory.
+        await asyncio.to_thread(copy_upload, input_file, save_path)
         input_file_path = str(save_path)
 
     # Build the full command list using the dedicated builder function.
@@ -390,7 +598,7 @@ async def run_command(
 
     # This inner function is a generator that runs the command and yields output.
     # It's used with StreamingResponse to send data to the frontend in real-time.
-    async def stream_output():
+    async def stream_output() -> AsyncIterator[bytes]:
         # Start the sldl process.
         # stdout and stderr are piped so we can read them.
         # The working directory is set to the app's root to ensure downloads go to the right place.
@@ -399,43 +607,54 @@ async def run_command(
             stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            cwd=BASE_DIR
+            cwd=BASE_DIR,
+            limit=PIPE_BUFFER_SIZE
         )
-
-        # Read and stream stdout line by line.
-        while True:
-            line = await process.stdout.readline()
-            if not line:
-                break
-            line_text = line.decode('utf-8')
-            # Check for keywords to determine if the line should be colored red.
-            color = 'default'
-            if any(keyword in line_text.lower() for keyword in ['no results', 'not found', 'failed', 'no suitable file']):
-                color = 'red'
-            # Yield the data as a JSON object for the frontend.
-            yield f"data: {json.dumps({'text': line_text, 'color': color})}\n\n"
-
-        # Read and stream any stderr output, always coloring it red.
-        while True:
-            line = await process.stderr.readline()
-            if not line:
-                break
-            line_text = line.decode('utf-8')
-            yield f"data: {json.dumps({'text': line_text, 'color': 'red'})}\n\n"
-
-        # Wait for the process to finish and check its exit code.
-        return_code = await process.wait()
+        enlarge_pipes(process)
+
+        # Stop sldl if the user goes away, even while it isn't printing anything.
+        watchdog = asyncio.create_task(stop_on_disconnect(request, process))
+
+        # Read stdout and stderr concurrently so stderr shows up as it happens
+        # and neither pipe can fill up and stall sldl. Each reader sends None when done.
+        queue = asyncio.Queue(maxsize=256)
+        readers = [
+            asyncio.create_task(read_output(process.stdout, queue, 'default')),
+            # stderr output is always colored red.
+            asyncio.create_task(read_output(process.stderr, queue, 'red')),
+        ]
+        try:
+            remaining = len(readers)
+            while remaining:
+                messages = await queue.get()
+                if messages is None:
+                    remaining -= 1
+                    continue
+                # Yield the batch as a JSON array for the frontend.
+                yield SSE_DATA + messages + SSE_END
+            await asyncio.gather(*readers)
+
+            # Wait for the process to finish and check its exit code.
+            return_code = await process.wait()
+        finally:
+            # Also reached when the response is cancelled because the client disconnected.
+            watchdog.cancel()
+            for reader in readers:
+                reader.cancel()
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
 
         # Relaxed Exit Code Check
         # Exit Code 1 often means "Partial Success" or "Some files failed"
         # We should treat 0 AND 1 as "Done" so the UI shows success.
         if return_code in [0, 1]:
             # Send a success signal to the frontend.
-            yield f"data: {json.dumps({'event': 'DONE'})}\n\n"
+            yield SSE_DONE
         else:
             # Send a crash signal with the exit code to the frontend.
-            yield f"data: {json.dumps({'event': 'CRASH', 'code': return_code})}\n\n"
-    return StreamingResponse(stream_output(), media_type="text/event-stream")
+            yield SSE_CRASH + json_dumps({'code': return_code}) + SSE_END
+    return StreamingResponse(stream_output(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 if __name__ == "__main__":
@@ -77,6 +77,19 @@ function startDownloadData(formData) {
     }).then(response => {
         const reader = response.body.getReader();
         const decoder = new TextDecoder();
+        // Events can be split across reads, so keep any incomplete tail for the next one.
+        let buffer = '';
+
+        function appendLine(message) {
+            const span = document.createElement('span');
+            span.textContent = message.text;
+
+            if (message.color === 'red') {
+                span.style.color = 'red';
+            }
+
+            output.appendChild(span);
+        }
 
         function push() {
             reader.read().then(({ done, value }) => {
@@ -84,51 +97,59 @@ function startDownloadData(formData) {
                     return;
                 }
 
-                const chunk = decoder.decode(value, { stream: true });
-                const lines = chunk.split('\n');
-
-                lines.forEach(line => {
-                    if (line.startsWith('data: ')) {
-                        const jsonString = line.substring(6).trim();
-                        if (!jsonString) return;
-
-                        try {
-                            const message = JSON.parse(jsonString);
-
-                            // Check for special events from the backend
-                            if (message.event === 'DONE') {
-                                output.appendChild(document.createTextNode('\nCommand finished successfully.'));
-                                output.classList.remove('running-border');
-                                output.classList.add('success-border');
-                                reader.cancel();
-                                return;
-                            } else if (message.event === 'CRASH') {
-                                output.classList.remove('running-border');
-                                crashAlert.textContent = `The program stopped unexpectedly with exit code: ${message.code}`;
-                                crashAlert.style.display = 'block';
-                                output.appendChild(document.createTextNode(`\nCommand failed. See error message above.`));
-                                reader.cancel();
-                                return;
-                            }
-
-                            // Handle regular text output
-                            const span = document.createElement('span');
-                            span.textContent = message.text;
-
-                            if (message.color === 'red') {
-                                span.style.color = 'red';
-                            }
-
-                            output.appendChild(span);
-                            // Auto-scroll
-                            output.scrollTop = output.scrollHeight;
-
-                        } catch (e) {
-                            // In case of non-json data, just print it
-                            output.appendChild(document.createTextNode(jsonString + '\n'));
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+
+                for (const event of events) {
+                    // Split the event into its name (if any) and data fields
+                    let name = 'message';
+                    const dataLines = [];
+                    event.split('\n').forEach(field => {
+                        if (field.startsWith('event: ')) {
+                            name = field.substring(7).trim();
+                        } else if (field.startsWith('data: ')) {
+                            dataLines.push(field.substring(6));
+                        }
+                    });
+                    const jsonString = dataLines.join('\n').trim();
+
+                    // Check for special events from the backend
+                    if (name === 'done') {
+                        output.appendChild(document.createTextNode('\nCommand finished successfully.'));
+                        output.classList.remove('running-border');
+                        output.classList.add('success-border');
+                        reader.cancel();
+                        return;
+                    } else if (name === 'crash') {
+                        const code = JSON.parse(jsonString).code;
+                        output.classList.remove('running-border');
+                        crashAlert.textContent = `The program stopped unexpectedly with exit code: ${code}`;
+                        crashAlert.style.display = 'block';
+                        output.appendChild(document.createTextNode(`\nCommand failed. See error message above.`));
+                        reader.cancel();
+                        return;
+                    }
+
+                    if (!jsonString) continue;
+
+                    try {
+                        const message = JSON.parse(jsonString);
+
+                        // Handle regular text output, which arrives in batches of lines
+                        if (Array.isArray(message)) {
+                            message.forEach(appendLine);
+                        } else {
+                            appendLine(message);
                         }
+                        // Auto-scroll
+                        output.scrollTop = output.scrollHeight;
+
+                    } catch (e) {
+                        // In case of non-json data, just print it
+                        output.appendChild(document.createTextNode(jsonString + '\n'));
                     }
-                });
+                }
 
                 push();
             });
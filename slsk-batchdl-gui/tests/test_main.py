@@ -1,4 +1,7 @@
 
+import asyncio
+import json
+
 import pytest
 
 # This is a bit of a hack to make the app importable
@@ -7,7 +10,8 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from main import build_command
+import main
+from main import build_command, collect_slsk_json, collect_slsk_lines, encode_messages, iter_line_batches
 
 # Expected path to the executable. All tests will check against this.
 EXECUTABLE_PATH = "../slsk-batchdl/bin/Debug/net6.0/sldl"
@@ -84,3 +88,72 @@ def test_build_command_no_input():
     command = build_command()
     assert command == [EXECUTABLE_PATH]
 
+
+def test_iter_line_batches_splits_chunks_into_lines():
+    """Tests that lines split across chunks are reassembled and the unterminated tail is kept."""
+    async def collect():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"first\nsec")
+        stream.feed_data(b"ond\nthird")
+        stream.feed_eof()
+        return [batch async for batch in iter_line_batches(stream)]
+
+    batches = asyncio.run(collect())
+    assert [line for batch in batches for line in batch] == [b"first\n", b"second\n", b"third"]
+
+def test_fetch_metadata_caches_by_normalized_key(monkeypatch):
+    """Tests that repeated lookups for the same artist/album only hit the network once."""
+    calls = []
+
+    async def fake_fetch(artist, album):
+        calls.append((artist, album))
+        return "https://example.com/art.jpg"
+
+    monkeypatch.setattr(main, "fetch_metadata_uncached", fake_fetch)
+    monkeypatch.setattr(main, "_META_CACHE", main.OrderedDict())
+
+    async def lookup_twice():
+        first = await main.fetch_metadata("Daft Punk", "Discovery")
+        second = await main.fetch_metadata(" daft punk", "DISCOVERY ")
+        return first, second
+
+    assert asyncio.run(lookup_twice()) == ("https://example.com/art.jpg", "https://example.com/art.jpg")
+    assert calls == [("Daft Punk", "Discovery")]
+
+def test_collect_slsk_lines_merges_documents_per_line():
+    """Tests that sldl output, read the way /search reads it, is merged into one candidate per album."""
+    async def collect():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b'[{"File": {"Filename": "@@user\\\\Music\\\\Daft Punk\\\\(2001) Discovery [FLAC]\\\\01.flac"}}]\n')
+        stream.feed_data(b'not json\n[{"File": {"Filename": "@@other/share/Daft Punk/Discovery/02.flac"}}]\n')
+        stream.feed_eof()
+        candidates = {}
+        async for lines in iter_line_batches(stream):
+            collect_slsk_lines(lines, candidates)
+        return list(candidates.values())
+
+    results = asyncio.run(collect())
+    assert len(results) == 1
+    assert results[0]["artist"] == "Daft Punk"
+    assert results[0]["album"] == "Discovery"
+    assert results[0]["files"] == 2
+
+def test_encode_messages_is_valid_json():
+    """Tests that hand-assembled message batches decode to the expected messages."""
+    payload = encode_messages([b'Searching "song"\n', b"Track not found\n", "café\n".encode()], "default")
+    assert json.loads(payload) == [
+        {"text": 'Searching "song"\n', "color": "default"},
+        {"text": "Track not found\n", "color": "red"},
+        {"text": "café\n", "color": "default"},
+    ]
+
+def test_collect_slsk_json_cleans_album_names():
+    """Tests that years, formats and tags (including nested ones) are stripped from album names."""
+    candidates = {}
+    collect_slsk_json(
+        '[{"File": {"Filename": "@@a/Music/Daft Punk/Discovery (Deluxe [FLAC] Edition)/01.flac"}},'
+        ' {"File": {"Filename": "@@b/Music/Daft Punk/2001 - Discovery [320] {Web [FLAC]}/02.mp3"}},'
+        ' {"File": {"Filename": "@@c/Music/Daft Punk/(1997) Homework (Web)/01.flac"}}]',
+        candidates
+    )
+    assert [(c["album"], c["files"]) for c in candidates.values()] == [("Discovery", 2), ("Homework", 1)]